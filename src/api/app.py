@@ -1,78 +1,160 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, Any, Optional, Final, Tuple, List, Deque
 from loguru import logger
 from ..config import get_settings
-import subprocess
+from .orjson_response import ORJSONResponse
+from .locust_summary import LocustSummaryParser
+import asyncio
+import aiofiles
+import orjson
 import json
-import os
+from pathlib import Path
+from contextlib import asynccontextmanager, suppress
+import shlex
+import time
+from functools import lru_cache
 from datetime import datetime
+from collections import deque
 
-app = FastAPI(title="Locust Performance Testing Framework")
+RESULTS_DIR: Final = Path("test_results")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the results directory once at startup"""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    yield
+
+app = FastAPI(
+    title="Locust Performance Testing Framework",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 settings = get_settings()
 
+# Plain module constants so request handling never goes through the settings model
+DEFAULT_USERS: Final = settings.LOCUST_USERS
+DEFAULT_SPAWN_RATE: Final = settings.LOCUST_SPAWN_RATE
+DEFAULT_RUN_TIME: Final = settings.LOCUST_RUN_TIME
+DEFAULT_HOST: Final = settings.LOCUST_HOST
+
 class TestConfig(BaseModel):
     """Test configuration model"""
-    users: int = settings.LOCUST_USERS
-    spawn_rate: int = settings.LOCUST_SPAWN_RATE
-    run_time: str = settings.LOCUST_RUN_TIME
-    host: str = settings.LOCUST_HOST
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    users: int = DEFAULT_USERS
+    spawn_rate: int = DEFAULT_SPAWN_RATE
+    run_time: str = DEFAULT_RUN_TIME
+    host: str = DEFAULT_HOST
     locustfile: str
     tags: Optional[Dict[str, Any]] = None
 
+# Output lines kept for the error detail of a failed test
+_ERROR_TAIL_LINES = 50
+
+# Longest output line read from Locust (asyncio's default is 64 KiB)
+_STREAM_LIMIT = 1024 * 1024
+
+# Fixed leading arguments of every Locust invocation
+_BASE_CMD: Final = ("locust", "--headless")
+
+@lru_cache(maxsize=128)
+def _tag_args(items: Tuple[Tuple[str, type, Any], ...]) -> Tuple[str, ...]:
+    """
+    Build the --tags arguments for a set of (key, value type, value) items - the
+    type keeps equal but differently rendered values like True, 1 and 1.0 apart
+    """
+    return tuple(arg for key, _, value in items for arg in ("--tags", f"{key}={value}"))
+
+def _write_results(result_file: Path, results: Dict[str, Any]) -> None:
+    """Write test results to disk"""
+    # Serialize first so a failure doesn't leave an empty results file behind
+    try:
+        data = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+    except TypeError:
+        # orjson rejects what the stdlib encoder handles, e.g. integers wider than 64 bits
+        data = json.dumps(results, indent=2).encode()
+    with open(result_file, "wb") as f:
+        f.write(data)
+
 @app.post("/run-test")
 async def run_test(config: TestConfig):
     """Run a Locust test with the given configuration"""
+    config_dict = config.model_dump()
     try:
         # Prepare command
-        cmd = [
-            "locust",
+        cmd: List[str] = [
+            *_BASE_CMD,
             "--host", config.host,
             "--users", str(config.users),
             "--spawn-rate", str(config.spawn_rate),
             "--run-time", config.run_time,
-            "--headless",
             "-f", config.locustfile
         ]
         
         # Add tags if provided
         if config.tags:
-            for key, value in config.tags.items():
-                cmd.extend(["--tags", f"{key}={value}"])
+            tag_items = tuple((key, type(value), value) for key, value in config.tags.items())
+            try:
+                cmd.extend(_tag_args(tag_items))
+            except TypeError:
+                # Unhashable tag values can't be cached
+                cmd.extend(_tag_args.__wrapped__(tag_items))
         
-        # Run test
-        logger.info(f"Starting test with config: {config.dict()}")
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        # Prepare output files
+        now = datetime.now()
+        # monotonic suffix keeps names unique for tests started in the same second
+        file_stamp = f"{now:%Y%m%d_%H%M%S}_{time.monotonic_ns()}"
+        log_file = RESULTS_DIR / f"test_output_{file_stamp}.log"
+        result_file = RESULTS_DIR / f"test_result_{file_stamp}.json"
+        
+        # Run test. Locust runs in its own process rather than in-process via
+        # locust.env.Environment: importing locust monkey-patches the stdlib
+        # with gevent, which can't share a thread with this asyncio event loop.
+        logger.info(f"Starting test with config: {config_dict}")
+        logger.debug(f"Locust command: {shlex.join(cmd)}")
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            # Locust logs its stats tables to stderr - read both as one stream
+            stderr=asyncio.subprocess.STDOUT,
+            limit=_STREAM_LIMIT
         )
         
-        stdout, stderr = process.communicate()
+        # Stream output to disk as it arrives so memory stays bounded; only
+        # the tail is kept for error reporting
+        parser = LocustSummaryParser()
+        tail: Deque[bytes] = deque(maxlen=_ERROR_TAIL_LINES)
+        
+        try:
+            async with aiofiles.open(log_file, "wb") as f:
+                async for line in process.stdout:
+                    await f.write(line)
+                    parser.feed(line)
+                    tail.append(line)
+            await process.wait()
+        finally:
+            if process.returncode is None:
+                # Streaming failed or was cancelled - don't leave Locust running,
+                # blocked on a pipe nobody reads any more
+                with suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
         
         if process.returncode != 0:
-            logger.error(f"Test failed: {stderr}")
-            raise HTTPException(status_code=500, detail=f"Test failed: {stderr}")
+            output_tail = b"".join(tail).decode(errors="replace")
+            logger.error(f"Test failed: {output_tail}")
+            raise HTTPException(status_code=500, detail=f"Test failed: {output_tail}")
         
         # Parse results
         results = {
-            "timestamp": datetime.now().isoformat(),
-            "config": config.dict(),
-            "output": stdout
+            "timestamp": now.isoformat(),
+            "config": config_dict,
+            "summary": parser.summary,
+            "output_file": str(log_file)
         }
         
-        # Save results
-        results_dir = "test_results"
-        os.makedirs(results_dir, exist_ok=True)
-        
-        result_file = os.path.join(
-            results_dir,
-            f"test_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        )
-        
-        with open(result_file, "w") as f:
-            json.dump(results, f, indent=2)
+        await asyncio.to_thread(_write_results, result_file, results)
         
         return results
     
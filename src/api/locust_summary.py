@@ -0,0 +1,31 @@
+from typing import Dict, Any
+
+class LocustSummaryParser:
+    """Incrementally extract the aggregated stats from Locust's headless output"""
+
+    def __init__(self):
+        self.summary: Dict[str, Any] = {}
+
+    def feed(self, line: bytes) -> None:
+        """Consume one line of Locust output (the stats tables are logged to stderr)"""
+        text = line.decode(errors="replace").strip()
+        if not text.startswith("Aggregated"):
+            return
+
+        try:
+            if "|" in text:
+                # Request stats: "Aggregated <reqs> <fails>(<pct>) | <avg> <min> <max> <med> | <req/s> <failures/s>"
+                counts, times, rates = (part.split() for part in text.split("|"))
+                self.summary.update({
+                    "requests": int(counts[1]),
+                    "failures": int(counts[2].split("(")[0]),
+                    "avg_response_time": float(times[0]),
+                    "requests_per_sec": float(rates[0]),
+                    "failures_per_sec": float(rates[1])
+                })
+            else:
+                # Response time percentiles: "Aggregated <50%> <66%> <75%> <80%> <90%> <95%> ..."
+                self.summary["p95_response_time"] = float(text.split()[6])
+        except (ValueError, IndexError):
+            # Unexpected table layout - keep whatever was parsed so far
+            pass
@@ -0,0 +1,13 @@
+from fastapi.responses import JSONResponse
+from typing import Any
+import orjson
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            # orjson rejects what the stdlib encoder handles, e.g. integers wider than 64 bits
+            return super().render(content)
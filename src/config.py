@@ -1,10 +1,12 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 from functools import lru_cache
 
 class Settings(BaseSettings):
     """Application settings"""
     
+    model_config = SettingsConfigDict(frozen=True, env_file=".env", case_sensitive=True)
+    
     # API Settings
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
@@ -20,6 +22,8 @@ class Settings(BaseSettings):
     INFLUXDB_TOKEN: Optional[str] = None
     INFLUXDB_ORG: Optional[str] = None
     INFLUXDB_BUCKET: Optional[str] = None
+    # Write through InfluxDB 3's native endpoint with no_sync (bucket is the database)
+    INFLUXDB_V3: bool = False
     
     # Redis Settings (for Celery)
     REDIS_HOST: str = "localhost"
@@ -28,12 +32,8 @@ class Settings(BaseSettings):
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "locust_framework.log"
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
 
-@lru_cache()
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Get cached settings instance"""
     return Settings() 
\ No newline at end of file
@@ -1,4 +1,5 @@
 from locust import LoadTestShape, HttpUser, task
+from bisect import bisect_left
 from typing import Optional, Tuple
 from LoadProfileFactory import LoadProfileFactory
 
@@ -31,6 +32,27 @@ class CustomLoadShape(LoadTestShape):
             .steady_users(self.STEADY_USERS, self.STEADY_DURATION) \
             .stress_ramp(self.STRESS_START_USERS, self.STRESS_END_USERS, self.STRESS_DURATION) \
             .build()
+        # Phase end times, ascending, for binary search in _phase_at()
+        self._ends = [phase.end_time for phase in self.phases]
+        # Index of the last resolved phase; run time mostly stays within it between ticks
+        self._current = 0
+
+    def _phase_at(self, run_time: float) -> Optional[Tuple[int, float]]:
+        """Resolve (user_count, spawn_rate) at the given run time from the phases."""
+        ends = self._ends
+        i = self._current
+        # Still inside the last resolved phase - the same index bisect_left would find
+        if not (i < len(ends) and run_time <= ends[i] and (i == 0 or run_time > ends[i - 1])):
+            i = bisect_left(ends, run_time)
+            if i == len(self.phases):
+                return None
+            self._current = i
+
+        phase = self.phases[i]
+        user_count = phase.user_count_at(run_time)
+        if user_count is None:
+            return None
+        return (user_count, phase.spawn_rate)
 
     def tick(self) -> Optional[Tuple[int, float]]:
         """
@@ -39,14 +61,7 @@ class CustomLoadShape(LoadTestShape):
         Returns:
             Optional[Tuple[int, float]]: A tuple of (user_count, spawn_rate) or None if no phase is active
         """
-        run_time = self.get_run_time()
-
-        for phase in self.phases:
-            user_count = phase.user_count_at(run_time)
-            if user_count is not None:
-                return (user_count, phase.spawn_rate)
-
-        return None
+        return self._phase_at(self.get_run_time())
 
 
 class MyUser(HttpUser):
@@ -1,16 +1,20 @@
 class Phase:
+    __slots__ = ('start_time', 'end_time', 'duration', 'user_start', 'user_end', 'delta', 'inv_duration', 'spawn_rate')
+
     def __init__(self, start_time, duration, user_start, user_end, spawn_rate):
         self.start_time = start_time
+        self.end_time = start_time + duration
         self.duration = duration
         self.user_start = user_start
         self.user_end = user_end
+        self.delta = user_end - user_start
+        self.inv_duration = 1.0 / duration if duration else 0.0
         self.spawn_rate = spawn_rate
 
     def user_count_at(self, t):
-        if t < self.start_time or t > self.start_time + self.duration:
+        if t < self.start_time or t > self.end_time:
             return None
-        if self.duration == 0:
+        if not self.inv_duration:
             return self.user_end
         # Linear interpolation
-        progress = (t - self.start_time) / self.duration
-        return int(self.user_start + (self.user_end - self.user_start) * progress)
+        return int(self.user_start + self.delta * (t - self.start_time) * self.inv_duration)
@@ -1,75 +1,139 @@
-from locust import HttpUser, task, between
+from locust import HttpUser, task, between, events
+from locust.clients import LocustHttpAdapter
 from loguru import logger
-from typing import Dict, Any, Optional, Callable, Union, List, Tuple
+from ..utils.metrics import MetricsCollector
+from typing import Dict, Any, Optional, Callable, Union, Tuple
 import json
-from enum import Enum, auto
+import orjson
+import sys
 from urllib.parse import urlencode, urljoin
 import time
+import os
+import io
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from typing import TypeVar, Generic
 
 T = TypeVar('T')
 
-class HTTPMethod(Enum):
-    """Enum for HTTP methods"""
-    GET = "GET"
-    POST = "POST"
-    PUT = "PUT"
-    DELETE = "DELETE"
-    PATCH = "PATCH"
-    HEAD = "HEAD"
-    OPTIONS = "OPTIONS"
+_DEBUG_LEVEL_NO = logger.level("DEBUG").no
 
-@dataclass
+def _debug_enabled() -> bool:
+    """
+    Whether any configured sink accepts DEBUG records, so debug logging costs
+    nothing on the request path when disabled. Read from Loguru on each call
+    since sinks are configured after import (or left at Loguru's DEBUG default).
+    """
+    return getattr(logger._core, "min_level", 0) <= _DEBUG_LEVEL_NO
+
+# Content-Type sent with bodies serialized from json_data
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+def _dumps_json(obj: Any) -> bytes:
+    """
+    Serialize a JSON body with orjson. Non-string dict keys are stringified as
+    json.dumps would; anything else orjson rejects (e.g. integers wider than
+    64 bits) falls back to the stdlib encoder.
+    """
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        return json.dumps(obj).encode()
+
+# Sentinel for lazily computed values
+_UNSET = object()
+
+@lru_cache(maxsize=1024)
+def _join_url(base_uri: str, path: str) -> str:
+    """Cached urljoin - tasks reuse a small set of URL templates"""
+    return urljoin(base_uri, path)
+
+@lru_cache(maxsize=4096)
+def _encode_query(items: Tuple[Tuple[str, type, Any], ...]) -> str:
+    """
+    Cached urlencode keyed by (key, value type, value) items - the type keeps
+    equal but differently rendered values like True, 1 and 1.0 apart
+    """
+    return urlencode([(key, value) for key, _, value in items])
+
+@lru_cache(maxsize=64)
+def _load_file(file_path: str, mtime: float) -> bytes:
+    """Read a file once per modification time and share its contents"""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+class HTTPMethod:
+    """Interned HTTP method names"""
+    GET = sys.intern("GET")
+    POST = sys.intern("POST")
+    PUT = sys.intern("PUT")
+    DELETE = sys.intern("DELETE")
+    PATCH = sys.intern("PATCH")
+    HEAD = sys.intern("HEAD")
+    OPTIONS = sys.intern("OPTIONS")
+
+@dataclass(frozen=True, slots=True)
 class RetryConfig:
     """Configuration for request retries"""
     max_attempts: int = 3
     delay: float = 1.0
     backoff_factor: float = 2.0
-    retry_on_status: List[int] = None
+    retry_on_status: Tuple[int, ...] = (500, 502, 503, 504)
 
-    def __post_init__(self):
-        if self.retry_on_status is None:
-            self.retry_on_status = [500, 502, 503, 504]
+DEFAULT_RETRY_CONFIG = RetryConfig()
 
 class ResponseValidator(Generic[T]):
     """Helper class for response validation"""
     
     def __init__(self, response: Any):
         self.response = response
-        self._checks: List[Tuple[str, bool]] = []
+        self._ok = True
+        self._json: Any = _UNSET
+    
+    def _get_json(self) -> Any:
+        """Parse the response body once and cache it (None if not JSON)"""
+        if self._json is _UNSET:
+            try:
+                self._json = orjson.loads(self.response.content)
+            except orjson.JSONDecodeError:
+                self._json = None
+        return self._json
     
     def status_is(self, status: int) -> 'ResponseValidator[T]':
-        self._checks.append(("status", self.response.status_code == status))
+        if not self._ok:
+            return self
+        self._ok = self.response.status_code == status
         return self
     
     def has_header(self, header: str) -> 'ResponseValidator[T]':
-        self._checks.append(("header", header in self.response.headers))
+        if not self._ok:
+            return self
+        self._ok = header in self.response.headers
         return self
     
     def json_contains(self, key: str) -> 'ResponseValidator[T]':
-        try:
-            data = self.response.json()
-            self._checks.append(("json_key", key in data))
-        except json.JSONDecodeError:
-            self._checks.append(("json_key", False))
+        if not self._ok:
+            return self
+        data = self._get_json()
+        self._ok = data is not None and key in data
         return self
     
     def json_matches(self, schema: Dict[str, Any]) -> 'ResponseValidator[T]':
-        try:
-            data = self.response.json()
-            # Simple schema validation - can be enhanced with jsonschema
-            for key, value in schema.items():
-                if key not in data or data[key] != value:
-                    self._checks.append(("json_schema", False))
-                    return self
-            self._checks.append(("json_schema", True))
-        except json.JSONDecodeError:
-            self._checks.append(("json_schema", False))
+        if not self._ok:
+            return self
+        data = self._get_json()
+        if data is None:
+            self._ok = False
+            return self
+        # Simple schema validation - can be enhanced with jsonschema
+        for key, value in schema.items():
+            if key not in data or data[key] != value:
+                self._ok = False
+                return self
         return self
     
     def validate(self) -> bool:
-        return all(check[1] for check in self._checks)
+        return self._ok
 
 class RequestBuilder:
     """Builder class for constructing HTTP requests with a fluent API"""
@@ -92,7 +156,7 @@ class RequestBuilder:
         self.log_request = True
         self.log_response = True
     
-    def setRequestMethod(self, method: HTTPMethod) -> 'RequestBuilder':
+    def setRequestMethod(self, method: str) -> 'RequestBuilder':
         """Set the HTTP method for the request"""
         self.method = method
         return self
@@ -131,7 +195,8 @@ class RequestBuilder:
         """Add a file to the request"""
         if self.files is None:
             self.files = {}
-        self.files[field_name] = (file_path, open(file_path, 'rb'), content_type)
+        data = _load_file(file_path, os.path.getmtime(file_path))
+        self.files[field_name] = (os.path.basename(file_path), io.BytesIO(data), content_type)
         return self
     
     def addQueryParams(self, params: Dict[str, Any]) -> 'RequestBuilder':
@@ -163,7 +228,7 @@ class RequestBuilder:
     
     def setRetryConfig(self, config: Optional[RetryConfig] = None) -> 'RequestBuilder':
         """Set the retry configuration"""
-        self.retry_config = config or RetryConfig()
+        self.retry_config = config or DEFAULT_RETRY_CONFIG
         return self
     
     def disableRequestLogging(self) -> 'RequestBuilder':
@@ -178,29 +243,86 @@ class RequestBuilder:
     
     def sendRequest(self) -> Dict[str, Any]:
         """Execute the request with all configured parameters"""
-        # Combine base URI and path
-        full_path = urljoin(self.base_uri, self.path)
+        full_path = self._build_path()
+        
+        # Retry loop kept inline (rather than calling _send) to save a frame per request
+        user = self.user
+        attempt = 0
+        while True:
+            try:
+                response = _do_http(
+                    user._request, user.logger, self.method, full_path,
+                    self.expected_status, self.json_data, self.form_data, None,
+                    self.files, self.name, self.headers, self.checks,
+                    self.timeout, self.log_request, self.log_response
+                )
+                
+                if not self.retry_config:
+                    return response
+                
+                attempt += 1
+                if attempt >= self.retry_config.max_attempts:
+                    return response
+                
+                if response.get('status_code') not in self.retry_config.retry_on_status:
+                    return response
+                
+                delay = self.retry_config.delay * (self.retry_config.backoff_factor ** (attempt - 1))
+                time.sleep(delay)
+                
+            except Exception as e:
+                if not self.retry_config or attempt >= self.retry_config.max_attempts:
+                    raise
+                attempt += 1
+                delay = self.retry_config.delay * (self.retry_config.backoff_factor ** (attempt - 1))
+                time.sleep(delay)
+    
+    def compile(self) -> Callable[[], Dict[str, Any]]:
+        """
+        Freeze the configured request into a reusable callable.
+        
+        URL joining, query encoding and JSON body serialization happen once here,
+        so each call only issues the request. Meant for fixed request shapes sent
+        on every task iteration; build it in on_start and call it from the task.
+        """
+        if self.files:
+            raise ValueError("Requests with file uploads can't be compiled")
+        
+        data = None
+        headers = self.headers
+        if self.json_data is not None and not self.form_data:
+            data = _dumps_json(self.json_data)
+            headers = {**_JSON_HEADERS, **self.headers}
+        return partial(self._send, self._build_path(), None, data, headers)
+    
+    def _build_path(self) -> str:
+        """Combine base URI, path and query string"""
+        full_path = _join_url(self.base_uri, self.path)
         
         if self.query_params:
-            query_string = urlencode(self.query_params)
+            try:
+                query_string = _encode_query(
+                    tuple((key, type(value), value) for key, value in self.query_params.items()))
+            except TypeError:
+                # Unhashable parameter values can't be cached
+                query_string = urlencode(self.query_params)
             full_path = f"{full_path}?{query_string}"
-        
+        return full_path
+    
+    def _send(self, full_path: str,
+              json_data: Optional[Dict[str, Any]],
+              data: Optional[bytes],
+              headers: Dict[str, str]) -> Dict[str, Any]:
+        """Issue a compiled request, retrying according to the retry configuration"""
+        user = self.user
         attempt = 0
         while True:
             try:
-                response = self.user.make_request(
-                    method=self.method,
-                    path=full_path,
-                    expected_status=self.expected_status,
-                    json_data=self.json_data,
-                    form_data=self.form_data,
-                    files=self.files,
-                    name=self.name,
-                    headers=self.headers,
-                    checks=self.checks,
-                    timeout=self.timeout,
-                    log_request=self.log_request,
-                    log_response=self.log_response
+                response = _do_http(
+                    user._request, user.logger, self.method, full_path,
+                    self.expected_status, json_data, self.form_data, data,
+                    self.files, self.name, headers, self.checks,
+                    self.timeout, self.log_request, self.log_response
                 )
                 
                 if not self.retry_config:
@@ -223,6 +345,86 @@ class RequestBuilder:
                 delay = self.retry_config.delay * (self.retry_config.backoff_factor ** (attempt - 1))
                 time.sleep(delay)
 
+def _do_http(request: Callable, log: Any, method: str, path: str,
+             expected_status: int,
+             json_data: Optional[Dict[str, Any]],
+             form_data: Optional[Dict[str, Any]],
+             data: Optional[bytes],
+             files: Optional[Dict[str, Any]],
+             name: Optional[str],
+             headers: Optional[Dict[str, str]],
+             checks: Optional[list[Callable]],
+             timeout: Optional[float],
+             log_request: bool,
+             log_response: bool) -> Dict[str, Any]:
+    """Issue a request through a bound client.request and process the response"""
+    request_name = name or f"{method} {path}"
+    
+    if log_request and _debug_enabled():
+        log.debug("Making request: {} {}", method, path)
+        if headers:
+            log.debug("Headers: {}", headers)
+        if json_data:
+            log.debug("JSON data: {}", json_data)
+        if form_data:
+            log.debug("Form data: {}", form_data)
+        if data:
+            log.debug("Body: {!r}", data)
+    
+    # Serialize JSON bodies with orjson rather than requests' json encoder.
+    # As with requests' json=, form data and files take precedence.
+    if json_data is not None and data is None and not form_data and not files:
+        data = _dumps_json(json_data)
+        headers = {**_JSON_HEADERS, **headers} if headers else _JSON_HEADERS
+    
+    with request(method, path, 
+                 data=form_data if data is None else data,
+                 files=files,
+                 headers=headers,
+                 catch_response=True,
+                 name=request_name,
+                 timeout=timeout) as response:
+        if response.status_code == expected_status:
+            # Run any additional checks
+            if checks:
+                for check in checks:
+                    check(response)
+            
+            try:
+                result = response.json()
+                if log_response and _debug_enabled():
+                    log.debug("Response: {}", result)
+                return result
+            except json.JSONDecodeError:
+                log.warning("Response is not JSON: {}", response.text)
+                return {"raw_response": response.text}
+        else:
+            log.error("Request failed: {} - {}", response.status_code, response.text)
+            response.failure(f"Expected status {expected_status}, got {response.status_code}")
+            return {}
+
+# Process-wide collector fed from Locust's request event (None when InfluxDB is off)
+_metrics: Optional[MetricsCollector] = None
+
+@events.init.add_listener
+def _on_locust_init(environment, **kwargs):
+    """Record request metrics to InfluxDB from the request event, if configured"""
+    global _metrics
+    collector = MetricsCollector()
+    if collector.write_api is None:
+        return
+    _metrics = collector
+    environment.events.request.add_listener(_on_request)
+    environment.events.quitting.add_listener(lambda **kw: collector.close())
+
+def _on_request(request_type, name, response_time, response_length, exception=None, **kwargs):
+    """Queue one request's metrics - runs after the response has been handled"""
+    _metrics.record_metric(
+        "locust_request",
+        {"response_time": response_time, "response_length": response_length},
+        tags={"name": name, "type": request_type, "ok": str(exception is None)}
+    )
+
 class BaseLocustUser(HttpUser):
     """Base class for all Locust user behaviors"""
     
@@ -231,9 +433,28 @@ class BaseLocustUser(HttpUser):
     
     wait_time = between(1, 3)  # Default wait time between tasks
     
+    # Keep-alive connection pool per user - size for concurrent requests within a task
+    pool_connections = 10
+    pool_maxsize = 100
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.logger = logger.bind(user_type=self.__class__.__name__)
+        
+        # Leave Locust's adapter alone when a shared pool_manager is configured;
+        # otherwise resize it, keeping Locust's adapter and its preloaded SSL context
+        if self.pool_manager is None:
+            adapter = LocustHttpAdapter(
+                pool_manager=None,
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                pool_block=False
+            )
+            self.client.mount("http://", adapter)
+            self.client.mount("https://", adapter)
+        self.client.headers.update({"Connection": "keep-alive"})
+        
+        self._request = self.client.request
     
     def on_start(self):
         """Called when a user starts"""
@@ -247,10 +468,11 @@ class BaseLocustUser(HttpUser):
         """Start building a new HTTP request"""
         return RequestBuilder(self, name)
     
-    def make_request(self, method: HTTPMethod, path: str, 
+    def make_request(self, method: str, path: str, 
                     expected_status: int = 200,
                     json_data: Optional[Dict[str, Any]] = None,
                     form_data: Optional[Dict[str, Any]] = None,
+                    data: Optional[bytes] = None,
                     files: Optional[Dict[str, Any]] = None,
                     name: Optional[str] = None,
                     headers: Optional[Dict[str, str]] = None,
@@ -262,11 +484,12 @@ class BaseLocustUser(HttpUser):
         Make an HTTP request with proper logging and error handling
         
         Args:
-            method: HTTP method from HTTPMethod enum
+            method: HTTP method name (see HTTPMethod)
             path: Request path
             expected_status: Expected HTTP status code
             json_data: Optional JSON data for request body
             form_data: Optional form data for request body
+            data: Optional pre-encoded request body (takes precedence over form_data)
             files: Optional files to upload
             name: Optional name for the request (for Locust statistics)
             headers: Optional headers to include in the request
@@ -278,41 +501,6 @@ class BaseLocustUser(HttpUser):
         Returns:
             Response data as dictionary
         """
-        request_name = name or f"{method.value} {path}"
-        headers = headers or {}
-        
-        if log_request:
-            self.logger.debug(f"Making request: {method.value} {path}")
-            if headers:
-                self.logger.debug(f"Headers: {headers}")
-            if json_data:
-                self.logger.debug(f"JSON data: {json_data}")
-            if form_data:
-                self.logger.debug(f"Form data: {form_data}")
-        
-        with self.client.request(method.value, path, 
-                               json=json_data,
-                               data=form_data,
-                               files=files,
-                               headers=headers,
-                               catch_response=True,
-                               name=request_name,
-                               timeout=timeout) as response:
-            if response.status_code == expected_status:
-                # Run any additional checks
-                if checks:
-                    for check in checks:
-                        check(response)
-                
-                try:
-                    result = response.json()
-                    if log_response:
-                        self.logger.debug(f"Response: {result}")
-                    return result
-                except json.JSONDecodeError:
-                    self.logger.warning(f"Response is not JSON: {response.text}")
-                    return {"raw_response": response.text}
-            else:
-                self.logger.error(f"Request failed: {response.status_code} - {response.text}")
-                response.failure(f"Expected status {expected_status}, got {response.status_code}")
-                return {} 
\ No newline at end of file
+        return _do_http(self._request, self.logger, method, path,
+                        expected_status, json_data, form_data, data, files, name,
+                        headers, checks, timeout, log_request, log_response)
\ No newline at end of file
@@ -1,25 +1,30 @@
 from ..locust_tasks.base import BaseLocustUser, HTTPMethod
-from locust import task, between
+from locust import task, constant_pacing
 from loguru import logger
 
 
 class SampleUser(BaseLocustUser):
     """Sample user behavior for testing"""
 
-    wait_time = between(1, 5)
+    wait_time = constant_pacing(3)
 
     baseuri = "https://reqres.in/"
 
+    def on_start(self):
+        super().on_start()
+        # Fixed request shape - build the URL and headers once per user
+        self._get_list_of_user = (self.http("Get List of User")
+                                  .setBaseUri(self.base_uri)
+                                  .setRequestMethod(HTTPMethod.GET)
+                                  .setBasePath("/api/users")
+                                  .addHeader("page", "2")
+                                  .compile())
+
     @task(1)
     def getListOfUser(self):
-        response = (self.http("Get List of User")
-                    .setBaseUri(self.base_uri)
-                    .setRequestMethod(HTTPMethod.GET)
-                    .setBasePath("/api/users")
-                    .addHeader("page", "2")
-                    .sendRequest())
+        response = self._get_list_of_user()
 
-        # Validate response
-        if not response.status_code == 200:
+        # Validate response - failed requests return an empty dict
+        if not response:
             logger.error("Failed to get list of user")
         return
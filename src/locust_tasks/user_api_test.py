@@ -1,4 +1,5 @@
 from locust import task, between
+import gevent
 from typing import Dict, Any
 from .base import BaseLocustUser, HTTPMethod, RetryConfig, ResponseValidator
 
@@ -59,7 +60,7 @@ class UserAPITest(BaseLocustUser):
                 max_attempts=3,
                 delay=1.0,
                 backoff_factor=2.0,
-                retry_on_status=[500, 502, 503]
+                retry_on_status=(500, 502, 503)
             ))
             .sendRequest())
         
@@ -79,6 +80,7 @@ class UserAPITest(BaseLocustUser):
         - Query parameters
         - Timeout configuration
         - Response validation
+        - Concurrent independent requests
         """
         # 1. Create new user
         create_response = (self.http("Create User")
@@ -100,16 +102,29 @@ class UserAPITest(BaseLocustUser):
         
         user_id = create_response["id"]
         
-        # 2. Upload user avatar
-        upload_response = (self.http("Upload Avatar")
+        # 2. Upload avatar and update user concurrently - they are independent
+        jobs = [
+            gevent.spawn(self._upload_avatar, user_id),
+            gevent.spawn(self._update_user, user_id)
+        ]
+        try:
+            gevent.joinall(jobs, raise_error=True)
+        finally:
+            # Don't leave a sibling running if one failed or the user is being stopped
+            gevent.killall(jobs)
+    
+    def _upload_avatar(self, user_id: Any) -> Dict[str, Any]:
+        """Upload the user's avatar"""
+        return (self.http("Upload Avatar")
             .setRequestMethod(HTTPMethod.POST)
             .setBasePath(f"/users/{user_id}/avatar")
             .addFile("avatar", "path/to/avatar.jpg", "image/jpeg")
             .addHeader("Authorization", f"Bearer {self.access_token}")
             .sendRequest())
-        
-        # 3. Update user with query parameters
-        update_response = (self.http("Update User")
+    
+    def _update_user(self, user_id: Any) -> Dict[str, Any]:
+        """Update the user with query parameters"""
+        return (self.http("Update User")
             .setRequestMethod(HTTPMethod.PUT)
             .setBasePath(f"/users/{user_id}")
             .setJsonBody({"name": "John Updated"})
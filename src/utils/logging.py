@@ -2,28 +2,42 @@ from loguru import logger
 import sys
 from ..config import get_settings
 
+_SETTINGS = get_settings()
+
 def setup_logging():
     """Configure logging with Loguru"""
-    settings = get_settings()
+    settings = _SETTINGS
+    # Extended tracebacks build expensive frame dumps - only worth it when debugging
+    debug = settings.LOG_LEVEL == "DEBUG"
     
     # Remove default handler
     logger.remove()
     
-    # Add console handler
+    # Add console handler - source location is only shown when debugging
+    if debug:
+        console_format = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+    else:
+        console_format = "<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <level>{message}</level>"
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        format=console_format,
         level=settings.LOG_LEVEL,
-        colorize=True
+        colorize=sys.stderr.isatty(),
+        enqueue=True,
+        backtrace=debug,
+        diagnose=debug
     )
     
-    # Add file handler
+    # Add file handler - JSON records for downstream tooling
     logger.add(
         settings.LOG_FILE,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+        serialize=True,
         level=settings.LOG_LEVEL,
         rotation="500 MB",
-        retention="10 days"
+        retention="10 days",
+        enqueue=True,
+        backtrace=debug,
+        diagnose=debug
     )
     
     logger.info("Logging configured successfully") 
\ No newline at end of file
@@ -1,37 +1,356 @@
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
 from loguru import logger
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, List
 from ..config import get_settings
 import time
+import queue
+import threading
+import atexit
+import gzip
+import math
+from urllib.parse import urlencode
+
+_SETTINGS = get_settings()
+
+# Queue sentinel telling the writer thread to exit
+_STOP = object()
+
+# Metrics held for the writer before new ones are dropped
+_QUEUE_SIZE = 200_000
+
+# Max points handed to the write API per call
+_DRAIN_SIZE = 1000
+
+# Line protocol bytes handed to the batching write API but not yet written
+# or failed, beyond which further batches are dropped
+_MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+# Seconds close() spends handing over queued metrics and delivering pending batches
+_CLOSE_TIMEOUT = 10.0
+
+# Batching write API request timeout and retry budget (milliseconds), sized so
+# delivering a batch to a dead server gives up within _CLOSE_TIMEOUT
+_WRITE_TIMEOUT = 3_000
+_WRITE_RETRY_INTERVAL = 1_000
+_WRITE_MAX_RETRY_DELAY = 2_000
+_WRITE_MAX_RETRY_TIME = 4_000
+_WRITE_MAX_RETRIES = 3
+
+# InfluxDB 3 write timeouts (seconds) and retry attempts per write
+_V3_CONNECT_TIMEOUT = 5.0
+_V3_READ_TIMEOUT = 10.0
+_V3_RETRIES = 3
+
+# Escaped tag fragments kept before the cache is reset
+_TAG_CACHE_SIZE = 10000
+
+# Line protocol escaping (see InfluxDB line protocol reference)
+_MEASUREMENT_ESCAPE = str.maketrans({",": "\\,", " ": "\\ ", "\n": "\\n", "\t": "\\t", "\r": "\\r"})
+_KEY_ESCAPE = str.maketrans({",": "\\,", "=": "\\=", " ": "\\ ", "\n": "\\n", "\t": "\\t", "\r": "\\r"})
+_STRING_ESCAPE = str.maketrans({"\\": "\\\\", '"': '\\"'})
+
+def _format_field_value(value: Any) -> Optional[str]:
+    """Format a field value as a line protocol literal, or None if it can't be written"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        # Line protocol has no nan/inf literal
+        if not math.isfinite(value):
+            return None
+        s = str(value)
+        return s[:-2] if s.endswith(".0") else s
+    return f'"{str(value).translate(_STRING_ESCAPE)}"'
+
+def _format_lp(measurement: str,
+               fields: Dict[str, Any],
+               tags: Optional[Dict[str, str]],
+               timestamp: Optional[int],
+               tag_cache: Dict[Tuple[str, type, Any], str]) -> Optional[str]:
+    """
+    Build one line protocol record without going through Point, producing
+    the same output Point.to_line_protocol() would.
+    
+    Returns None when no writable field is left (None and nan/inf values are
+    skipped), as a record without fields is rejected by InfluxDB.
+    """
+    field_set = []
+    for key in sorted(fields):
+        value = fields[key]
+        if value is None:
+            continue
+        literal = _format_field_value(value)
+        if literal is not None:
+            field_set.append(f"{key.translate(_KEY_ESCAPE)}={literal}")
+    if not field_set:
+        return None
+    
+    line = measurement.translate(_MEASUREMENT_ESCAPE)
+    if tags:
+        for key in sorted(tags):
+            value = tags[key]
+            if value is None or value == "":
+                continue
+            # Keyed on the type too - True, 1 and 1.0 are equal but render differently
+            cache_key = (key, type(value), value)
+            fragment = tag_cache.get(cache_key)
+            if fragment is None:
+                if len(tag_cache) >= _TAG_CACHE_SIZE:
+                    tag_cache.clear()
+                escaped = str(value).translate(_KEY_ESCAPE)
+                if escaped.endswith("\\"):
+                    # Keep a trailing backslash from escaping the separator
+                    escaped += " "
+                fragment = f",{key.translate(_KEY_ESCAPE)}={escaped}"
+                tag_cache[cache_key] = fragment
+            line += fragment
+    if timestamp is None:
+        # InfluxDB stamps the point on receipt
+        return f"{line} {','.join(field_set)}"
+    return f"{line} {','.join(field_set)} {timestamp}"
+
+class _V3WriteApi:
+    """
+    Line protocol writer for InfluxDB 3's /api/v3/write_lp endpoint.
+    
+    Writes use no_sync, so the server acknowledges before persisting to disk -
+    an acceptable trade for load test telemetry. Batching is done by the
+    collector's writer thread; each write() is one gzipped POST.
+    """
+    
+    def __init__(self, url: str, token: str):
+        import urllib3
+        
+        # Bounded so a stalled server can't hold the writer thread indefinitely
+        self._http = urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=_V3_CONNECT_TIMEOUT, read=_V3_READ_TIMEOUT),
+            retries=urllib3.Retry(total=_V3_RETRIES, backoff_factor=0.5,
+                                  status_forcelist=(429, 500, 502, 503, 504),
+                                  allowed_methods=None, raise_on_status=False)
+        )
+        self._url = f"{url.rstrip('/')}/api/v3/write_lp"
+        self._headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Encoding": "gzip"
+        }
+    
+    def write(self, bucket: str, record: bytes):
+        query = urlencode({"db": bucket, "precision": "nanosecond", "no_sync": "true"})
+        response = self._http.request(
+            "POST",
+            f"{self._url}?{query}",
+            body=gzip.compress(record),
+            headers=self._headers
+        )
+        if response.status >= 300:
+            raise RuntimeError(f"InfluxDB write failed: {response.status} {response.data!r}")
+    
+    def close(self):
+        self._http.clear()
+
+class _SharedClient:
+    """An InfluxDB client and write API shared by the collectors of one process"""
+    
+    __slots__ = ("key", "client", "write_api", "scheduler", "refs", "lock", "pending", "_pending_lock",
+                 "close_deadline")
+    
+    def __init__(self, key: Tuple[str, str, Optional[str], bool]):
+        self.key = key
+        self.client = None
+        self.write_api = None
+        # Thread pool the batching write API sends batches on
+        self.scheduler = None
+        self.refs = 0
+        # The batching write API's buffer is not safe for concurrent writers
+        self.lock = threading.Lock()
+        # Bytes buffered or retrying inside the batching write API; its buffer
+        # is unbounded, so this is where an InfluxDB stall piles up data
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        # time.monotonic() after which closing stops retrying failed batches
+        self.close_deadline: Optional[float] = None
+    
+    def write(self, bucket: str, records: List[bytes]) -> bool:
+        """
+        Hand line protocol records to the write API.
+        
+        Returns False without writing when too much data is still pending.
+        """
+        batching = self.client is not None
+        if batching:
+            # Each record is one item of the write API's batches, which are joined
+            # with one newline - so one extra byte per record matches len(data) + 1
+            # reported per batch in _batch_done()
+            size = sum(map(len, records)) + len(records)
+            with self._pending_lock:
+                if self.pending + size > _MAX_PENDING_BYTES:
+                    return False
+                self.pending += size
+            record = records
+        else:
+            record = b"\n".join(records)
+        try:
+            with self.lock:
+                self.write_api.write(bucket=bucket, record=record)
+        except Exception:
+            if batching:
+                with self._pending_lock:
+                    self.pending -= size
+            raise
+        return True
+    
+    def _batch_done(self, conf, data: bytes, exception: Optional[Exception] = None):
+        """Write API callback for a batch that was written or finally failed"""
+        with self._pending_lock:
+            self.pending -= len(data) + 1
+    
+    def _batch_retry(self, conf, data: bytes, exception: Exception):
+        """Write API callback before a failed batch is retried - fails it instead once closing has run out of time"""
+        deadline = self.close_deadline
+        if deadline is not None and time.monotonic() >= deadline:
+            raise exception
+
+# Shared clients by connection settings
+_clients: Dict[Tuple[str, str, Optional[str], bool], _SharedClient] = {}
+_clients_lock = threading.Lock()
+
+def _create_client(url: str, token: str, org: Optional[str], v3: bool, shared: _SharedClient):
+    """Create an InfluxDB client and write API for a connection"""
+    if v3:
+        write_api = _V3WriteApi(url, token)
+        logger.info("InfluxDB 3 writer configured")
+        return None, write_api
+    
+    # Imported here rather than at module level so that in Locust
+    # processes urllib3 is loaded after gevent's monkey-patching,
+    # making batch flushes cooperative instead of blocking the hub.
+    from influxdb_client import InfluxDBClient
+    from influxdb_client.client.write_api import WriteOptions
+    from reactivex.scheduler import ThreadPoolScheduler
+    
+    client = InfluxDBClient(url=url, token=token, org=org, enable_gzip=True, timeout=_WRITE_TIMEOUT)
+    # Own scheduler (WriteOptions' default is shared) so closing can drop unsent batches
+    shared.scheduler = ThreadPoolScheduler(max_workers=1)
+    # Batching writer: points are queued and flushed in bulk
+    write_api = client.write_api(write_options=WriteOptions(
+        batch_size=5000,
+        flush_interval=1000,
+        jitter_interval=200,
+        retry_interval=_WRITE_RETRY_INTERVAL,
+        max_retries=_WRITE_MAX_RETRIES,
+        max_retry_delay=_WRITE_MAX_RETRY_DELAY,
+        max_retry_time=_WRITE_MAX_RETRY_TIME,
+        write_scheduler=shared.scheduler
+    ), success_callback=shared._batch_done, error_callback=shared._batch_done,
+       retry_callback=shared._batch_retry)
+    logger.info("InfluxDB connection established")
+    return client, write_api
+
+def _acquire_client(url: str, token: str, org: Optional[str], v3: bool = False) -> _SharedClient:
+    """Attach a collector to the process-wide client for a connection, creating it on first use"""
+    key = (url, token, org, v3)
+    with _clients_lock:
+        shared = _clients.get(key)
+        if shared is None:
+            shared = _SharedClient(key)
+            shared.client, shared.write_api = _create_client(url, token, org, v3, shared)
+            _clients[key] = shared
+        shared.refs += 1
+        return shared
+
+def _release_client(shared: _SharedClient, deadline: float):
+    """Detach a collector; the last one out delivers pending batches and closes the client"""
+    with _clients_lock:
+        shared.refs -= 1
+        if shared.refs:
+            return
+        del _clients[shared.key]
+    shared.close_deadline = deadline
+    _close_client(shared)
+
+def _close_client(shared: _SharedClient):
+    """Deliver pending batches and close a shared InfluxDB client, giving up at its close deadline"""
+    if shared.scheduler:
+        # The batching write API's close() waits for every batch to be sent
+        closer = threading.Thread(target=shared.write_api.close, name="metrics-close", daemon=True)
+        closer.start()
+        closer.join(max(shared.close_deadline - time.monotonic(), 0))
+        if closer.is_alive():
+            # Drop batches not sent yet; the one in flight fails without further retries
+            shared.scheduler.executor.shutdown(wait=False, cancel_futures=True)
+            logger.warning("InfluxDB unreachable on close - dropped {} bytes of pending metrics",
+                           shared.pending)
+    else:
+        shared.write_api.close()
+    if shared.client:
+        shared.client.close()
+    logger.info("InfluxDB connection closed")
+
+def _close_all_clients():
+    """Close clients whose collectors were never closed"""
+    with _clients_lock:
+        remaining = list(_clients.values())
+        _clients.clear()
+    deadline = time.monotonic() + _CLOSE_TIMEOUT
+    for shared in remaining:
+        shared.close_deadline = deadline
+        _close_client(shared)
+
+atexit.register(_close_all_clients)
 
 class MetricsCollector:
     """Collect and store metrics in InfluxDB"""
     
-    def __init__(self):
-        self.settings = get_settings()
+    __slots__ = ("client", "write_api", "_shared", "_bucket", "_queue", "_writer", "_server_assigned_time",
+                 "_tag_cache", "_drops", "_shed", "_reported_drops")
+    
+    def __init__(self, server_assigned_time: bool = False):
+        """
+        Args:
+            server_assigned_time: Leave metrics without an explicit timestamp
+                unstamped so InfluxDB assigns the time on ingest
+        """
+        settings = _SETTINGS
         self.client = None
         self.write_api = None
-        self._setup_influxdb()
+        self._shared: Optional[_SharedClient] = None
+        self._bucket = settings.INFLUXDB_BUCKET
+        self._server_assigned_time = server_assigned_time
+        # Tag values repeat heavily across metrics, so escape each (key, value) once
+        self._tag_cache: Dict[Tuple[str, type, Any], str] = {}
+        # Bounded so a writer thread that falls behind sheds metrics instead of growing memory
+        self._queue: queue.Queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._drops = 0
+        # Metrics the writer thread dropped while InfluxDB was behind
+        self._shed = 0
+        self._reported_drops = 0
+        self._writer: Optional[threading.Thread] = None
+        self._setup_influxdb(settings)
     
-    def _setup_influxdb(self):
+    def _setup_influxdb(self, settings):
         """Setup InfluxDB connection if configured"""
-        if all([
-            self.settings.INFLUXDB_URL,
-            self.settings.INFLUXDB_TOKEN,
-            self.settings.INFLUXDB_ORG,
-            self.settings.INFLUXDB_BUCKET
-        ]):
+        if (settings.INFLUXDB_URL and settings.INFLUXDB_TOKEN and settings.INFLUXDB_BUCKET
+                and (settings.INFLUXDB_ORG or settings.INFLUXDB_V3)):
             try:
-                self.client = InfluxDBClient(
-                    url=self.settings.INFLUXDB_URL,
-                    token=self.settings.INFLUXDB_TOKEN,
-                    org=self.settings.INFLUXDB_ORG
+                # Collectors share one client and connection pool per process
+                self._shared = _acquire_client(
+                    settings.INFLUXDB_URL,
+                    settings.INFLUXDB_TOKEN,
+                    settings.INFLUXDB_ORG,
+                    settings.INFLUXDB_V3
                 )
-                self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
-                logger.info("InfluxDB connection established")
+                self.client = self._shared.client
+                self.write_api = self._shared.write_api
+                # Points are built and handed to InfluxDB off the caller's path
+                self._writer = threading.Thread(
+                    target=self._write_loop,
+                    name="metrics-writer",
+                    daemon=True
+                )
+                self._writer.start()
             except Exception as e:
-                logger.error(f"Failed to connect to InfluxDB: {e}")
+                logger.error("Failed to connect to InfluxDB: {}", e)
                 self.client = None
                 self.write_api = None
     
@@ -47,38 +366,96 @@ class MetricsCollector:
             measurement: Name of the measurement
             fields: Dictionary of field values
             tags: Optional dictionary of tags
-            timestamp: Optional timestamp (defaults to current time)
+            timestamp: Optional timestamp in nanoseconds (defaults to current time,
+                or ingest time when server_assigned_time is set)
         """
         if not self.write_api:
             return
         
+        # Stamp now so queueing delay doesn't skew the metric time
+        if timestamp is None and not self._server_assigned_time:
+            timestamp = time.time_ns()
         try:
-            point = Point(measurement)
-            
-            # Add fields
-            for key, value in fields.items():
-                point = point.field(key, value)
-            
-            # Add tags
-            if tags:
-                for key, value in tags.items():
-                    point = point.tag(key, value)
+            self._queue.put_nowait((measurement, fields, tags, timestamp))
+        except queue.Full:
+            self._drops += 1
+    
+    @property
+    def dropped(self) -> int:
+        """Number of metrics dropped because the write queue was full or InfluxDB was behind"""
+        return self._drops + self._shed
+    
+    def _write_loop(self):
+        """Drain queued metrics into the InfluxDB write API until stopped"""
+        while True:
+            item = self._queue.get()
+            batch = []
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= _DRAIN_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            if item is _STOP:
+                return
+    
+    def _write_batch(self, batch):
+        """Convert queued metrics to line protocol and hand them to the write API"""
+        try:
+            tag_cache = self._tag_cache
+            # Metrics left without a writable field format to None and are skipped
+            records = [record for record in (_format_lp(*metric, tag_cache) for metric in batch) if record]
             
-            # Add timestamp
-            if timestamp is None:
-                timestamp = int(time.time() * 1e9)  # Convert to nanoseconds
-            point = point.time(timestamp)
+            # Report new drops alongside the data so lossy telemetry is visible
+            drops = self.dropped
+            if drops != self._reported_drops:
+                logger.warning("Metrics backlog full - {} metrics dropped so far", drops)
+                records.append(_format_lp("metrics_collector", {"dropped": drops}, None,
+                                          time.time_ns(), tag_cache))
             
-            # Write to InfluxDB
-            self.write_api.write(
-                bucket=self.settings.INFLUXDB_BUCKET,
-                record=point
-            )
+            if not records:
+                return
+            # Queue for the next batch write to InfluxDB, unless too much is still in flight.
+            # Records go in one by one so the write API's batch_size counts points.
+            if self._shared.write(self._bucket, [record.encode() for record in records]):
+                self._reported_drops = drops
+            else:
+                self._shed += len(batch)
         except Exception as e:
-            logger.error(f"Failed to write metric to InfluxDB: {e}")
+            logger.error("Failed to write metric to InfluxDB: {}", e)
     
     def close(self):
-        """Close InfluxDB connection"""
-        if self.client:
-            self.client.close()
-            logger.info("InfluxDB connection closed") 
\ No newline at end of file
+        """
+        Stop collecting and hand queued metrics to the write API.
+        
+        The shared InfluxDB client stays open while other collectors use it;
+        closing the last one delivers pending batches and closes the client.
+        Against an unreachable InfluxDB this gives up after about _CLOSE_TIMEOUT.
+        """
+        if self.write_api:
+            deadline = time.monotonic() + _CLOSE_TIMEOUT
+            if self._writer:
+                # Never block on a full queue - make room by dropping the oldest metric
+                while True:
+                    try:
+                        self._queue.put_nowait(_STOP)
+                        break
+                    except queue.Full:
+                        try:
+                            self._queue.get_nowait()
+                            self._drops += 1
+                        except queue.Empty:
+                            pass
+                self._writer.join(max(deadline - time.monotonic(), 0))
+                if self._writer.is_alive():
+                    logger.warning("Metrics writer still busy after {}s - abandoning {} queued metrics",
+                                   _CLOSE_TIMEOUT, self._queue.qsize())
+                self._writer = None
+            _release_client(self._shared, deadline)
+            self._shared = None
+            self.client = None
+            self.write_api = None 
\ No newline at end of file
@@ -0,0 +1,27 @@
+from pathlib import Path
+from src.api.locust_summary import LocustSummaryParser
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_parses_captured_headless_output():
+    """Aggregated stats are extracted from real `locust --headless` output"""
+    parser = LocustSummaryParser()
+    with open(DATA_DIR / "locust_headless_output.txt", "rb") as f:
+        for line in f:
+            parser.feed(line)
+
+    assert parser.summary == {
+        "requests": 108,
+        "failures": 51,
+        "avg_response_time": 4.0,
+        "requests_per_sec": 29.09,
+        "failures_per_sec": 13.73,
+        "p95_response_time": 6.0
+    }
+
+
+def test_ignores_output_without_stats():
+    parser = LocustSummaryParser()
+    parser.feed(b"[2026-10-15 10:39:50,471] vm/INFO/locust.main: Starting Locust 2.46.7\n")
+    assert parser.summary == {}
@@ -0,0 +1,44 @@
+import pytest
+from influxdb_client import Point
+from src.utils.metrics import _format_lp
+
+TIMESTAMP = 1_700_000_000_000_000_000
+
+
+def _point_lp(measurement, fields, tags, timestamp):
+    point = Point(measurement)
+    for key, value in (tags or {}).items():
+        point.tag(key, value)
+    for key, value in fields.items():
+        point.field(key, value)
+    if timestamp is not None:
+        point.time(timestamp)
+    return point.to_line_protocol() or None
+
+
+@pytest.mark.parametrize("measurement, fields, tags, timestamp", [
+    ("http_request", {"response_time": 12.5, "status_code": 200, "success": True}, {"method": "GET"}, TIMESTAMP),
+    ("m", {"whole": 3.0, "big": 1e20, "small": 0.1}, None, TIMESTAMP),
+    ("m", {"text": 'say "hi"\\', "missing": None}, {"empty": "", "none": None}, None),
+    ("my measure,x", {"field key=1": 1}, {"tag key,=": "a b,c=d", "trailing": "x\\"}, TIMESTAMP),
+    ("tab\tm\r", {"f\n": -7}, {"t\t": "v\r\n"}, TIMESTAMP),
+    ("m", {"nan": float("nan"), "inf": float("inf"), "ok": 1.5}, None, TIMESTAMP),
+    ("m", {"nan": float("nan"), "none": None}, {"t": "x"}, TIMESTAMP),
+])
+def test_format_lp_matches_point(measurement, fields, tags, timestamp):
+    """Hand-built line protocol is identical to what Point produces"""
+    assert _format_lp(measurement, fields, tags, timestamp, {}) == _point_lp(measurement, fields, tags, timestamp)
+
+
+def test_format_lp_tag_cache_is_reused():
+    tag_cache = {}
+    first = _format_lp("m", {"v": 1}, {"host": "a b"}, TIMESTAMP, tag_cache)
+    assert _format_lp("m", {"v": 1}, {"host": "a b"}, TIMESTAMP, tag_cache) == first
+    assert len(tag_cache) == 1
+
+
+def test_format_lp_tag_cache_keeps_equal_values_of_different_types_apart():
+    tag_cache = {}
+    assert _format_lp("m", {"v": 1}, {"k": 1}, None, tag_cache) == "m,k=1 v=1i"
+    assert _format_lp("m", {"v": 1}, {"k": True}, None, tag_cache) == "m,k=True v=1i"
+    assert _format_lp("m", {"v": 1}, {"k": 1.0}, None, tag_cache) == "m,k=1.0 v=1i"